@@ -0,0 +1,21 @@
+"""Gunicorn configuration for the digit classifier web application.
+
+Gunicorn loads this file from the working directory; the server options are
+set on the command line in the Dockerfile.
+"""
+
+
+def post_fork(server, worker):
+    """Load the model in each worker process after it is forked.
+
+    With --preload, CPU models are loaded once on import in the master
+    process and shared with the workers, making this a no-op. CUDA cannot
+    be used in a process forked after initializing it, and the native
+    threads of ONNX Runtime do not survive a fork either, so GPU models and
+    ONNX Runtime sessions are loaded by each worker here, before it accepts
+    requests.
+    """
+
+    import webapp
+
+    webapp.load_model()
@@ -2,7 +2,8 @@
 
 This module implements a CNN architecture optimized for the MNIST dataset
 of handwritten digits. It provides model definition, training and testing
-functionality.
+functionality, along with weight pruning and post-training static INT8
+quantization.
 
 Source: https://github.com/pytorch/examples/tree/main/mnist
 """
@@ -11,10 +12,22 @@ import argparse
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.nn.utils.prune as prune
 import torch.optim as optim
 from torchvision import datasets, transforms
+from torch.ao.quantization import DeQuantStub, QuantStub
 from torch.optim.lr_scheduler import StepLR
 
+# Backend for quantized kernels (x86 AVX2/AVX512/VNNI)
+QUANTIZED_ENGINE = "fbgemm"
+
+# Spatial positions per conv2 channel after pooling (12x12), flattened into
+# the inputs of fc1
+POOLED_POSITIONS = 12 * 12
+
+# Hidden layers whose output channels are removed by structured pruning
+PRUNED_LAYERS = ("conv1", "conv2", "fc1")
+
 
 class CNN(nn.Module):
     """Convolutional Neural Network for handwritten digit classification.
@@ -24,20 +37,33 @@ class CNN(nn.Module):
     fully connected layers to perform the classification.
     """
 
-    def __init__(self):
+    def __init__(self, conv1_channels=32, conv2_channels=64, fc1_features=128):
         """Initialize the CNN architecture with predefined layers.
 
         The network is initialized with convolutional layers, pooling,
         dropout for regularization, and fully connected layers.
+
+        Args:
+            conv1_channels: Number of output channels of the first
+                convolutional layer.
+            conv2_channels: Number of output channels of the second
+                convolutional layer.
+            fc1_features: Number of output features of the first fully
+                connected layer.
         """
 
         super(CNN, self).__init__()
-        self.conv1 = nn.Conv2d(1, 32, 3, 1)
-        self.conv2 = nn.Conv2d(32, 64, 3, 1)
+        self.quant = QuantStub()
+        self.conv1 = nn.Conv2d(1, conv1_channels, 3, 1)
+        self.relu1 = nn.ReLU()
+        self.conv2 = nn.Conv2d(conv1_channels, conv2_channels, 3, 1)
+        self.relu2 = nn.ReLU()
         self.dropout1 = nn.Dropout(0.25)
         self.dropout2 = nn.Dropout(0.5)
-        self.fc1 = nn.Linear(9216, 128)
-        self.fc2 = nn.Linear(128, 10)
+        self.fc1 = nn.Linear(conv2_channels * POOLED_POSITIONS, fc1_features)
+        self.relu3 = nn.ReLU()
+        self.fc2 = nn.Linear(fc1_features, 10)
+        self.dequant = DeQuantStub()
 
     def forward(self, x):
         """Forward pass of the CNN.
@@ -51,11 +77,13 @@ class CNN(nn.Module):
             for each digit class (0-9).
         """
 
+        x = self.quant(x)
+
         x = self.conv1(x)
-        x = F.relu(x)
+        x = self.relu1(x)
 
         x = self.conv2(x)
-        x = F.relu(x)
+        x = self.relu2(x)
 
         x = F.max_pool2d(x, 2)
 
@@ -64,16 +92,32 @@ class CNN(nn.Module):
         x = torch.flatten(x, 1)
 
         x = self.fc1(x)
-        x = F.relu(x)
+        x = self.relu3(x)
 
         x = self.dropout2(x)
         x = self.fc2(x)
 
+        x = self.dequant(x)
+
         output = F.log_softmax(x, dim=1)
 
         return output
 
 
+def binarize(image):
+    """Threshold an image to the 0/1 cells drawn in the web application.
+
+    Args:
+        image: Tensor of pixel intensities in [0, 1].
+
+    Returns:
+        Tensor of the same shape, with 1.0 for pixels above 0.5 and 0.0
+        elsewhere.
+    """
+
+    return (image > 0.5).float()
+
+
 def train(args, model, device, train_loader, optimizer, epoch):
     """Train the model for one epoch.
 
@@ -151,6 +195,134 @@ def test(model, device, test_loader):
     )
 
 
+def cnn_for_state_dict(state_dict):
+    """Create a CNN with the layer sizes of a saved state_dict.
+
+    Pruned models have fewer channels than the default architecture, so
+    the sizes are read from the weights. Both floating point and quantized
+    state_dicts are supported.
+
+    Args:
+        state_dict: The state_dict the model will load.
+
+    Returns:
+        A floating point CNN whose layers match the state_dict.
+    """
+
+    if "fc1.weight" in state_dict:
+        fc1_weight = state_dict["fc1.weight"]
+    else:
+        fc1_weight, _ = state_dict["fc1._packed_params._packed_params"]
+
+    return CNN(
+        conv1_channels=state_dict["conv1.weight"].shape[0],
+        conv2_channels=state_dict["conv2.weight"].shape[0],
+        fc1_features=fc1_weight.shape[0],
+    )
+
+
+def prune_model(model, amount):
+    """Prune the output channels with the smallest L2 norm in each layer.
+
+    Whole filters of the convolutional layers and neurons of fc1 are
+    masked, along with their biases, so the model can be fine-tuned with
+    them held at zero before shrink_model removes them.
+
+    Args:
+        model: The trained CNN to prune.
+        amount: Fraction of the output channels to prune in each layer.
+    """
+
+    for name in PRUNED_LAYERS:
+        module = getattr(model, name)
+        prune.ln_structured(module, name="weight", amount=amount, n=2, dim=0)
+        channel_mask = module.weight_mask.flatten(1).any(dim=1)
+        prune.custom_from_mask(module, name="bias", mask=channel_mask)
+
+
+def shrink_model(model):
+    """Remove the pruned channels from a model pruned with prune_model.
+
+    Args:
+        model: The pruned CNN.
+
+    Returns:
+        A smaller CNN containing only the unpruned channels, computing the
+        same outputs as the pruned model.
+    """
+
+    kept = {}
+    for name in PRUNED_LAYERS:
+        module = getattr(model, name)
+        kept[name] = module.weight_mask.flatten(1).any(dim=1).nonzero().flatten()
+        prune.remove(module, "weight")
+        prune.remove(module, "bias")
+
+    conv1, conv2, fc1 = (kept[name] for name in PRUNED_LAYERS)
+    positions = torch.arange(POOLED_POSITIONS, device=conv2.device)
+    fc1_inputs = (conv2[:, None] * POOLED_POSITIONS + positions).flatten()
+
+    small_model = CNN(len(conv1), len(conv2), len(fc1)).to(conv1.device)
+    with torch.no_grad():
+        small_model.conv1.weight.copy_(model.conv1.weight[conv1])
+        small_model.conv1.bias.copy_(model.conv1.bias[conv1])
+        small_model.conv2.weight.copy_(model.conv2.weight[conv2][:, conv1])
+        small_model.conv2.bias.copy_(model.conv2.bias[conv2])
+        small_model.fc1.weight.copy_(model.fc1.weight[fc1][:, fc1_inputs])
+        small_model.fc1.bias.copy_(model.fc1.bias[fc1])
+        small_model.fc2.weight.copy_(model.fc2.weight[:, fc1])
+        small_model.fc2.bias.copy_(model.fc2.bias)
+
+    return small_model
+
+
+def prepare_quantization(model):
+    """Fuse the model layers and insert observers for INT8 quantization.
+
+    Args:
+        model: The floating point CNN to prepare.
+
+    Returns:
+        The prepared model, ready to be calibrated and converted with
+        torch.ao.quantization.convert.
+    """
+
+    torch.backends.quantized.engine = QUANTIZED_ENGINE
+
+    model.eval()
+    model.qconfig = torch.ao.quantization.get_default_qconfig(QUANTIZED_ENGINE)
+    model = torch.ao.quantization.fuse_modules(
+        model,
+        [["conv1", "relu1"], ["conv2", "relu2"], ["fc1", "relu3"]],
+    )
+
+    return torch.ao.quantization.prepare(model)
+
+
+def quantize(model, device, calibration_loader, num_batches=10):
+    """Convert a trained model to a statically quantized INT8 model.
+
+    Args:
+        model: The trained floating point CNN.
+        device: The device (CPU) to perform calibration on.
+        calibration_loader: DataLoader providing calibration data in batches.
+        num_batches: Number of batches used to calibrate the activation
+            observers.
+
+    Returns:
+        The quantized model.
+    """
+
+    model = prepare_quantization(model)
+    with torch.no_grad():
+        for batch_idx, (data, _) in enumerate(calibration_loader):
+            if batch_idx >= num_batches:
+                break
+            model(data.to(device))
+
+    return torch.ao.quantization.convert(model)
+
+
 def main():
     """Main function to run the training and evaluation of the CNN model.
 
@@ -233,6 +405,20 @@ def main():
         default=False,
         help="For Saving the current Model",
     )
+    parser.add_argument(
+        "--quantize",
+        action="store_true",
+        default=False,
+        help="quantize the saved model to INT8 instead of training",
+    )
+    parser.add_argument(
+        "--prune",
+        type=float,
+        default=0.0,
+        metavar="P",
+        help="fine-tune and shrink the saved model with a fraction P of its "
+        "channels pruned",
+    )
     args = parser.parse_args()
     use_cuda = not args.no_cuda and torch.cuda.is_available()
     use_mps = not args.no_mps and torch.backends.mps.is_available()
@@ -263,7 +449,34 @@ def main():
     train_loader = torch.utils.data.DataLoader(dataset1, **train_kwargs)
     test_loader = torch.utils.data.DataLoader(dataset2, **test_kwargs)
 
-    model = CNN().to(device)
+    if args.quantize:
+        # Calibrate on digits preprocessed like the web app's grid cells,
+        # binarized and not normalized, as that is what the model will see
+        served_transform = transforms.Compose([transforms.ToTensor(), binarize])
+        served_dataset = datasets.MNIST(
+            "../data", train=False, transform=served_transform
+        )
+        served_loader = torch.utils.data.DataLoader(served_dataset, **test_kwargs)
+
+        # Quantized kernels only run on the CPU
+        state_dict = torch.load("cnn_weights.pt", map_location="cpu", weights_only=True)
+        model = cnn_for_state_dict(state_dict)
+        model.load_state_dict(state_dict)
+        model = quantize(model, torch.device("cpu"), served_loader)
+        test(model, torch.device("cpu"), served_loader)
+        torch.save(model.state_dict(), "cnn_weights_int8.pt")
+        return
+
+    if args.prune:
+        # Fine-tune the saved model with its smallest channels pruned
+        state_dict = torch.load(
+            "cnn_weights.pt", map_location=device, weights_only=True
+        )
+        model = cnn_for_state_dict(state_dict).to(device)
+        model.load_state_dict(state_dict)
+        prune_model(model, args.prune)
+    else:
+        model = CNN().to(device)
     optimizer = optim.Adadelta(model.parameters(), lr=args.lr)
 
     scheduler = StepLR(optimizer, step_size=1, gamma=args.gamma)
@@ -272,6 +485,10 @@ def main():
         test(model, device, test_loader)
         scheduler.step()
 
+    if args.prune:
+        model = shrink_model(model)
+        test(model, device, test_loader)
+
     if args.save_model:
         torch.save(model.state_dict(), "cnn_weights.pt")
 
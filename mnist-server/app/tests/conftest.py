@@ -0,0 +1,13 @@
+"""Pytest configuration for the digit classifier tests.
+
+The app modules are imported from, and load their weights relative to, the
+app directory.
+"""
+
+import os
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, APP_DIR)
+os.chdir(APP_DIR)
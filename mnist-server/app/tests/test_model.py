@@ -0,0 +1,41 @@
+"""Tests for pruning and sizing the CNN."""
+
+import torch
+
+from model import CNN, cnn_for_state_dict, prune_model, quantize, shrink_model
+
+
+def test_shrink_model_matches_pruned_model():
+    torch.manual_seed(0)
+    model = CNN()
+    prune_model(model, 0.5)
+    model.eval()
+
+    data = (torch.rand(4, 1, 28, 28) > 0.8).float()
+    with torch.no_grad():
+        expected = model(data)
+        small_model = shrink_model(model).eval()
+        output = small_model(data)
+
+    assert small_model.conv1.out_channels == 16
+    assert small_model.conv2.out_channels == 32
+    assert small_model.fc1.out_features == 64
+    torch.testing.assert_close(output, expected)
+
+
+def test_cnn_for_state_dict_reads_layer_sizes():
+    state_dict = CNN(8, 16, 32).state_dict()
+    model = cnn_for_state_dict(state_dict)
+
+    model.load_state_dict(state_dict)
+    assert model.fc1.in_features == 16 * 12 * 12
+
+
+def test_cnn_for_state_dict_reads_quantized_layer_sizes():
+    model = CNN(8, 16, 32).eval()
+    calibration_data = [(torch.rand(2, 1, 28, 28), None)]
+    state_dict = quantize(model, torch.device("cpu"), calibration_data).state_dict()
+
+    model = cnn_for_state_dict(state_dict)
+    assert (model.conv1.out_channels, model.conv2.out_channels) == (8, 16)
+    assert model.fc1.out_features == 32
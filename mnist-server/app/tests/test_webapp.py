@@ -0,0 +1,132 @@
+"""Tests for the digit classifier web application."""
+
+import base64
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import torch
+
+import webapp
+
+# A vertical stroke in the middle of the grid
+GRID = [[int(8 < col < 14 and 4 < row < 24) for col in range(28)] for row in range(28)]
+
+
+def encode_bits(grid):
+    """Pack a grid the way the frontend does."""
+
+    return base64.b64encode(np.packbits(np.array(grid, dtype=np.uint8))).decode()
+
+
+@pytest.fixture
+def client():
+    webapp.classify.cache_clear()
+    return webapp.app.test_client()
+
+
+def test_batched_predictions_match_unbatched(client, monkeypatch):
+    grids = []
+    for row in range(28):
+        grid = np.zeros((28, 28), dtype=np.uint8)
+        grid[row] = 1
+        grids.append(encode_bits(grid))
+
+    expected = [webapp.classify(base64.b64decode(bits)) for bits in grids]
+    webapp.classify.cache_clear()
+    monkeypatch.setattr(webapp, "BATCH_INFERENCE", True)
+
+    def predict(bits):
+        return webapp.app.test_client().post("/predict", json={"bits": bits})
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(predict, grids))
+
+    assert all(response.status_code == 200 for response in responses)
+    predictions = [response.get_json()["prediction"] for response in responses]
+    assert predictions == [prediction for prediction, _ in expected]
+
+
+def test_predict_caches_repeated_drawings(client):
+    first = client.post("/predict", json={"bits": encode_bits(GRID)}).get_json()
+    second = client.post("/predict", json={"bits": encode_bits(GRID)}).get_json()
+
+    assert first == second
+    assert webapp.classify.cache_info().hits == 1
+    assert webapp.classify.cache_info().misses == 1
+
+
+def test_predict_accepts_packed_bits(client):
+    response = client.post("/predict", json={"bits": encode_bits(GRID)})
+
+    # The bits unpack most significant bit first, back into the drawn grid
+    grid = torch.tensor(GRID, dtype=webapp.INPUT_DTYPE).view(1, 1, 28, 28)
+    with torch.inference_mode():
+        expected = int(webapp.MODEL(grid).argmax(dim=1))
+
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "Success."
+    assert response.get_json()["prediction"] == expected
+
+
+@pytest.mark.parametrize("path", ["/", "/templates/index.html"])
+def test_index_is_served_with_cache_headers(client, path):
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert b"Digit Classifier" in response.data
+    assert response.headers["Cache-Control"] == "public, max-age=3600"
+
+
+@pytest.mark.parametrize("grid", [GRID, [cell for row in GRID for cell in row]])
+def test_predict_accepts_list_grids(client, grid):
+    expected = client.post("/predict", json={"bits": encode_bits(GRID)}).get_json()
+    response = client.post("/predict", json={"grid": grid})
+
+    assert response.status_code == 200
+    assert response.get_json() == expected
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"grid": [1] * 10},
+        {"grid": [1] * 900},
+        {"grid": [-1] * 784},
+        {"grid": [2] * 784},
+        {"grid": [0.5] * 784},
+        {"grid": [1.0] * 784},
+        {"grid": [True] * 784},
+        {"grid": ["1"] * 784},
+        {"grid": "01" * 392},
+        {"grid": [[1] * 28, 1]},
+        {"grid": [[1] * 28] * 27 + [[1] * 27]},
+        {"grid": 1},
+        {"bits": "abc"},
+        {"bits": "!!"},
+        {"bits": 1},
+        {"bits": base64.b64encode(bytes(97)).decode()},
+        {"foo": 1},
+        [1, 2],
+        b"{not json",
+    ],
+)
+def test_predict_rejects_malformed_grids(client, body):
+    if isinstance(body, bytes):
+        response = client.post("/predict", data=body, content_type="application/json")
+    else:
+        response = client.post("/predict", json=body)
+
+    assert response.status_code == 400
+    assert response.get_json() == {"status": "Invalid grid data."}
+
+
+def test_routes_are_registered_once():
+    rules = sorted(rule.rule for rule in webapp.app.url_map.iter_rules())
+
+    assert rules == [
+        "/",
+        "/predict",
+        "/static/<path:filename>",
+        "/templates/index.html",
+    ]
@@ -4,18 +4,78 @@ This module implements a web interface that allows users to draw digits on a
 28x28 grid. The drawing is then classified using a pre-trained CNN model.
 """
 
+import base64
+import functools
+import io
+import itertools
 import logging
 import os
+import queue
+import threading
+import time
 import numpy as np
+import orjson
 import torch
+from concurrent.futures import Future
 from logging.handlers import RotatingFileHandler
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 
-from model import CNN
+from model import QUANTIZED_ENGINE, cnn_for_state_dict, prepare_quantization
+
+try:
+    import intel_extension_for_pytorch as ipex
+except ImportError:
+    ipex = None
+
+
+class OrjsonProvider(JSONProvider):
+    """JSON provider using orjson to parse requests and encode responses."""
+
+    def dumps(self, obj, **kwargs):
+        """Serialize data as a JSON string.
+
+        Args:
+            obj: The data to serialize.
+
+        Returns:
+            str: The JSON document.
+        """
+
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        """Deserialize data from a JSON string or bytes.
+
+        Args:
+            s: The JSON document.
+
+        Returns:
+            The deserialized data.
+        """
+
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Serialize the given arguments as a JSON response.
+
+        The orjson bytes are passed to the response as is, skipping the
+        decode to a string done by dumps.
+
+        Returns:
+            flask.Response: The JSON response.
+        """
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
 
 
 # Set up the Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# The page is static, so let browsers cache it instead of refetching it
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 3600
 
 # Configure logging
 if not app.debug:
@@ -36,332 +96,494 @@ if not app.debug:
     app.logger.setLevel(logging.INFO)
     app.logger.info("Digit classifier startup")
 
-TORCH_DEVICE = torch.device("cpu")
+# Number of cells in the 28x28 drawing grid
+GRID_CELLS = 28 * 28
+
+# Inference backend, one of "fp32", "int8", "bf16" or "onnx"
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "fp32")
+
+# Run on the GPU when there is one, unless the backend only runs on the CPU
+if torch.cuda.is_available() and INFERENCE_BACKEND in ("fp32", "bf16"):
+    TORCH_DEVICE = torch.device("cuda")
+    torch.backends.cudnn.benchmark = True
+else:
+    TORCH_DEVICE = torch.device("cpu")
+
+# Coalesce concurrent requests into a single batched forward pass
+BATCH_INFERENCE = os.environ.get("BATCH_INFERENCE", "0") == "1"
+BATCH_MAX_SIZE = 32
+BATCH_TIMEOUT = 0.005
+
+# Compile the fp32 and bf16 models with torch.compile instead of TorchScript
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "0") == "1"
 
-# Load model
-MODEL = CNN().to(TORCH_DEVICE)
-MODEL.load_state_dict(
-    torch.load(
+# Data type of the model inputs
+INPUT_DTYPE = torch.bfloat16 if INFERENCE_BACKEND == "bf16" else torch.float32
+
+# A single (1, 1, 28, 28) input is too small to benefit from intra-op
+# parallelism, and INT8 kernels in particular slow down with more threads.
+# Concurrency comes from the gunicorn workers instead.
+torch.set_num_threads(1)
+torch.set_num_interop_threads(1)
+
+# The app only runs inference, so skip autograd bookkeeping while loading.
+# Grad mode is thread-local, so request handlers use torch.inference_mode()
+torch.set_grad_enabled(False)
+
+
+def load_fp32_model():
+    """Load the floating point CNN.
+
+    The layer sizes are taken from the checkpoint, so pruned and shrunk
+    models load as well.
+
+    Returns:
+        CNN: The model with the trained weights loaded.
+    """
+
+    # Memory-map the checkpoint so its pages are read in on demand, and
+    # assign the loaded tensors rather than copying them into new ones
+    state_dict = torch.load(
         "cnn_weights.pt",
         map_location=TORCH_DEVICE,
         weights_only=True,
+        mmap=True,
     )
-)
+    model = cnn_for_state_dict(state_dict).to(TORCH_DEVICE)
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
 
+    return model
 
-@app.route("/")
-def index():
-    """Serve the main page of the application.
+
+def load_int8_model():
+    """Load the statically quantized INT8 CNN.
+
+    The quantized weights are produced once with `python model.py --quantize`.
+    Falls back to the floating point model if the quantized weights are
+    missing or the CPU has no support for the quantized engine.
 
     Returns:
-        str: Rendered HTML template for the main page.
+        torch.nn.Module: The quantized model.
     """
 
-    return render_template("index.html")
+    if QUANTIZED_ENGINE not in torch.backends.quantized.supported_engines:
+        app.logger.warning("%s is not supported, using fp32", QUANTIZED_ENGINE)
+        return load_fp32_model()
+    if not os.path.exists("cnn_weights_int8.pt"):
+        app.logger.warning("cnn_weights_int8.pt not found, using fp32")
+        return load_fp32_model()
 
+    # Build the quantized module structure, then load the calibrated weights
+    state_dict = torch.load("cnn_weights_int8.pt", weights_only=True, mmap=True)
+    model = prepare_quantization(cnn_for_state_dict(state_dict))
+    model = torch.ao.quantization.convert(model)
+    model.load_state_dict(state_dict)
 
-@app.route("/predict", methods=["POST"])
-def predict():
-    """Process the drawing data and perform digit classification.
+    return model
+
+
+def load_bf16_model():
+    """Load the CNN with its weights converted to bfloat16.
 
-    This endpoint receives the grid data from the frontend, converts it to
-    the format expected by the model, runs inference, and returns the
-    prediction results.
+    BF16 halves the memory traffic of FP32 and runs on the AVX512-BF16 and
+    AMX units of recent Xeon CPUs. The model is further optimized with the
+    Intel Extension for PyTorch when it is installed.
 
     Returns:
-        flask.Response: JSON response containing the prediction result,
-        confidence score, and status message.
+        torch.nn.Module: The bfloat16 model.
+    """
+
+    model = load_fp32_model().to(torch.bfloat16)
+    if ipex is not None:
+        model = ipex.optimize(model, dtype=torch.bfloat16)
+
+    return model
+
+
+def load_onnx_model():
+    """Export the CNN to ONNX and load it into an ONNX Runtime session.
+
+    ONNX Runtime folds constants and fuses the conv/relu layers into its
+    MLAS kernels, avoiding the per-op dispatch overhead of PyTorch. The
+    model is exported in memory, so nothing is written to the app directory.
+    onnxruntime is imported here rather than at the top of the module, as
+    importing it starts native threads that break gunicorn workers forked
+    from a preloaded master.
+
+    Returns:
+        Callable[[torch.Tensor], torch.Tensor]: Function running the session
+        on a batch of inputs and returning the model output.
+
+    Raises:
+        RuntimeError: If onnxruntime is not installed.
+    """
+
+    try:
+        import onnxruntime as ort
+    except ImportError as e:
+        raise RuntimeError(
+            "The onnx backend requires onnxruntime to be installed"
+        ) from e
+
+    onnx_model = io.BytesIO()
+    torch.onnx.export(
+        load_fp32_model(),
+        torch.zeros(1, 1, 28, 28),
+        onnx_model,
+        opset_version=17,
+        input_names=["x"],
+        output_names=["y"],
+        dynamic_axes={"x": {0: "batch"}, "y": {0: "batch"}},
+        dynamo=False,
+    )
+
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    session_options.intra_op_num_threads = 1
+    session_options.inter_op_num_threads = 1
+    session = ort.InferenceSession(
+        onnx_model.getvalue(),
+        sess_options=session_options,
+        providers=["CPUExecutionProvider"],
+    )
+
+    def run(x):
+        (output,) = session.run(None, {"x": x.numpy()})
+        return torch.from_numpy(output)
+
+    return run
+
+
+def trace_model(model):
+    """Compile the model to a frozen, inference-optimized TorchScript module.
+
+    The input shape is fixed, so tracing captures the whole forward pass.
+    Freezing inlines the weights as constants and optimize_for_inference
+    folds and fuses the remaining ops.
+
+    Args:
+        model (torch.nn.Module): The model to compile, in eval mode.
+
+    Returns:
+        torch.jit.ScriptModule: The compiled model.
     """
 
-    data = request.get_json()
+    example = torch.zeros(1, 1, 28, 28, dtype=INPUT_DTYPE, device=TORCH_DEVICE)
+    model = torch.jit.freeze(torch.jit.trace(model, example))
+
+    return torch.jit.optimize_for_inference(model)
+
+
+def compile_model(model):
+    """Compile the model with torch.compile and the inductor backend.
+
+    Inductor fuses the small conv/relu/linear graph into a few generated
+    kernels, and the reduce-overhead mode replays them with CUDA graphs on
+    the GPU. Compilation happens on the first forward pass, which is run
+    at startup. When batching, a second graph with a dynamic batch size is
+    compiled at startup, so no batch size recompiles on the request path.
+
+    Args:
+        model (torch.nn.Module): The model to compile, in eval mode.
+
+    Returns:
+        Callable[[torch.Tensor], torch.Tensor]: The compiled model.
+    """
+
+    return torch.compile(model, mode="reduce-overhead", fullgraph=True)
+
+
+MODEL_LOADERS = {
+    "fp32": load_fp32_model,
+    "int8": load_int8_model,
+    "bf16": load_bf16_model,
+    "onnx": load_onnx_model,
+}
+
+if INFERENCE_BACKEND not in MODEL_LOADERS:
+    raise ValueError(f"Unknown inference backend: {INFERENCE_BACKEND}")
+
+# The model and its preallocated input, set up by load_model. Unbatched
+# requests reuse the input under INPUT_LOCK; on the GPU, inputs are staged
+# in pinned host memory for asynchronous copies.
+MODEL = None
+MODEL_LOCK = threading.Lock()
+INPUT_BUFFER = None
+INPUT_LOCK = threading.Lock()
+HOST_BUFFER = None
+
+
+def load_model():
+    """Load, compile and warm up the model in the current process.
+
+    GPU and ONNX models are not loaded on import, but by each gunicorn
+    worker after it forks (see gunicorn.conf.py) or by the first request.
+    Calls after the first do nothing.
+    """
+
+    global MODEL, INPUT_BUFFER, HOST_BUFFER
+
+    with MODEL_LOCK, torch.no_grad():
+        if MODEL is not None:
+            return
+
+        # Load model, compiling it unless it runs outside PyTorch. The
+        # quantized model always uses TorchScript, as inductor cannot
+        # compile its modules.
+        model = MODEL_LOADERS[INFERENCE_BACKEND]()
+        if TORCH_COMPILE and INFERENCE_BACKEND in ("fp32", "bf16"):
+            model = compile_model(model)
+        elif isinstance(model, torch.nn.Module):
+            model = trace_model(model)
+
+        INPUT_BUFFER = torch.empty(1, 1, 28, 28, dtype=INPUT_DTYPE, device=TORCH_DEVICE)
+        if TORCH_DEVICE.type == "cuda":
+            HOST_BUFFER = torch.empty(1, 1, 28, 28, dtype=INPUT_DTYPE).pin_memory()
+
+        # Warm up the model, so the JIT profiling runs and cuDNN kernel
+        # selection happen before the first request
+        with torch.inference_mode():
+            for _ in range(2):
+                model(INPUT_BUFFER.zero_())
+
+            # Warm up the batch worker's inputs too. Batches of more than
+            # one input are compiled with a dynamic batch dimension, which
+            # the conv kernels split into small and large batch graphs.
+            if BATCH_INFERENCE:
+                for batch_size in (1, 2, BATCH_MAX_SIZE):
+                    batch = torch.zeros(
+                        batch_size, 1, 28, 28, dtype=INPUT_DTYPE, device=TORCH_DEVICE
+                    )
+                    if TORCH_COMPILE and batch_size > 1:
+                        torch._dynamo.mark_dynamic(batch, 0)
+                    model(batch)
+
+        MODEL = model
+
+
+# Load CPU models on import, so a preloaded app shares them with the forked
+# gunicorn workers. GPU models and ONNX Runtime sessions are loaded by each
+# worker instead (see gunicorn.conf.py).
+if TORCH_DEVICE.type != "cuda" and INFERENCE_BACKEND != "onnx":
+    load_model()
+
+# Pending (input, future) pairs waiting for the batch worker
+BATCH_QUEUE = queue.Queue()
+BATCH_WORKER = None
+BATCH_WORKER_LOCK = threading.Lock()
+
+
+def run_batch_worker():
+    """Run batched inference over the requests queued by predict.
+
+    Waits for a request, then collects further requests for up to
+    BATCH_TIMEOUT seconds or BATCH_MAX_SIZE inputs, runs them through the
+    model as one batch, and resolves each request's future with its row of
+    the output.
+    """
+
+    while True:
+        inputs, futures = [], []
+        data, future = BATCH_QUEUE.get()
+        inputs.append(data)
+        futures.append(future)
+
+        deadline = time.monotonic() + BATCH_TIMEOUT
+        while len(inputs) < BATCH_MAX_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                data, future = BATCH_QUEUE.get(timeout=timeout)
+            except queue.Empty:
+                break
+            inputs.append(data)
+            futures.append(future)
+
+        try:
+            with torch.inference_mode():
+                batch = torch.cat(inputs).to(TORCH_DEVICE)
+                outputs = MODEL(batch).cpu().split(1)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            continue
+
+        for future, output in zip(futures, outputs):
+            future.set_result(output)
+
+
+def infer_batched(data):
+    """Queue an input for the batch worker and wait for its output.
+
+    The worker thread is started lazily so that each gunicorn worker
+    process runs its own, including after forking from a preloaded app.
+
+    Args:
+        data (torch.Tensor): Input tensor of shape (1, 1, 28, 28).
+
+    Returns:
+        torch.Tensor: Model output of shape (1, 10).
+    """
+
+    global BATCH_WORKER
+
+    if BATCH_WORKER is None or not BATCH_WORKER.is_alive():
+        with BATCH_WORKER_LOCK:
+            if BATCH_WORKER is None or not BATCH_WORKER.is_alive():
+                BATCH_WORKER = threading.Thread(target=run_batch_worker, daemon=True)
+                BATCH_WORKER.start()
+
+    future = Future()
+    BATCH_QUEUE.put((data, future))
+
+    return future.result()
+
+
+@functools.lru_cache(maxsize=4096)
+def classify(grid_key):
+    """Classify a drawing, caching the results for repeated drawings.
+
+    Args:
+        grid_key (bytes): The binary 28x28 grid packed into 98 bytes, most
+            significant bit first.
+
+    Returns:
+        tuple: The predicted digit and its confidence.
+    """
+
+    if MODEL is None:
+        load_model()
 
     # Convert the grid data to a Pytorch tensor
-    grid_data = data["grid"]
-    grid_array = np.array(grid_data, dtype=np.float32) / 1.0
-    data = torch.reshape(torch.tensor(grid_array), (1, 1, 28, 28))
+    grid = np.unpackbits(np.frombuffer(grid_key, dtype=np.uint8), count=GRID_CELLS)
+    data = torch.from_numpy(grid).view(1, 1, 28, 28)
 
     # Calculate prediction and confidence using the Pytorch model
-    output = MODEL(data)
-    prediction = output.argmax(dim=1, keepdim=True)
-    confidence, _ = torch.max(torch.nn.functional.softmax(output, dim=1), 1)
+    if BATCH_INFERENCE:
+        output = infer_batched(data.to(INPUT_DTYPE)).float()
+    else:
+        with INPUT_LOCK, torch.inference_mode():
+            if HOST_BUFFER is not None:
+                data = HOST_BUFFER.copy_(data)
+            INPUT_BUFFER.copy_(data, non_blocking=True)
+            # Copying the output back waits for the GPU, so the buffers are
+            # free to reuse once the lock is released
+            output = MODEL(INPUT_BUFFER).float().cpu()
 
-    return jsonify(
-        {
-            "prediction": prediction.item(),
-            "confidence": f"{confidence.item():.2f}%",
-            "status": "Success.",
-        }
-    )
+    # Softmax is monotonic, so the prediction is the argmax of the logits
+    prediction = int(output.argmax(dim=1))
+    confidence = float(torch.softmax(output, dim=1)[0, prediction])
 
+    return prediction, confidence
 
-@app.route("/templates/index.html")
-def get_template():
-    """Serve the index.html template.
 
-    This route is an alternative way to access the main page template.
+def pack_grid(grid_data):
+    """Pack a grid of cells sent as a JSON list into a prediction cache key.
+
+    Args:
+        grid_data (list): The 784 cells of the grid, either as a flat list
+            or as 28 rows of 28 cells, each the integer 0 or 1.
 
     Returns:
-        str: Rendered HTML template for the main page.
+        bytes: The grid packed into 98 bytes, most significant bit first.
+
+    Raises:
+        TypeError: If the grid is not a list.
+        ValueError: If the grid has the wrong size or a cell is not 0 or 1.
     """
 
-    return render_template("index.html")
+    if not isinstance(grid_data, list):
+        raise TypeError("Expected a list of cells")
+
+    if len(grid_data) == 28 and all(
+        isinstance(row, list) and len(row) == 28 for row in grid_data
+    ):
+        grid_data = list(itertools.chain.from_iterable(grid_data))
+    elif len(grid_data) != GRID_CELLS:
+        raise ValueError(f"Expected {GRID_CELLS} cells or 28 rows of 28 cells")
 
+    # Booleans are ints in Python, so compare the exact type
+    if not all(type(cell) is int and 0 <= cell <= 1 for cell in grid_data):
+        raise ValueError("Grid cells must be the integers 0 or 1")
 
-def create_template():
-    """Create the HTML template file if it doesn't exist.
+    grid = np.fromiter(grid_data, dtype=np.uint8, count=GRID_CELLS)
 
-    This function generates the index.html file with all the necessary HTML,
-    CSS, and JavaScript for the web interface. It creates the templates
-    directory if needed.
+    return np.packbits(grid).tobytes()
+
+
+@app.route("/")
+def index():
+    """Serve the main page of the application.
 
     Returns:
-        None
+        flask.Response: The static HTML file for the main page.
     """
 
-    if not os.path.exists("templates"):
-        os.makedirs("templates")
-
-    with open("templates/index.html", "w") as f:
-        f.write(
-            """<!DOCTYPE html>
-<html>
-<head>
-    <title>Digit Classifier</title>
-    <style>
-        body {
-            font-family: Arial, sans-serif;
-            text-align: center;
-            margin: 0;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }
-        .container {
-            max-width: 800px;
-            margin: 0 auto;
-            background-color: white;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 0 10px rgba(0,0,0,0.1);
-        }
-        h1 {
-            color: #333;
-        }
-        .drawing-container {
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            margin: 20px auto;
-        }
-        .grid-container {
-            display: grid;
-            grid-template-columns: repeat(28, 10px);
-            grid-template-rows: repeat(28, 10px);
-            gap: 1px;
-            background-color: #333;
-            padding: 1px;
-            border: 2px solid #333;
-        }
-        .grid-cell {
-            width: 10px;
-            height: 10px;
-            background-color: black;
-            cursor: pointer;
-        }
-        .active {
-            background-color: white;
-        }
-        .button-container {
-            margin: 20px 0;
-        }
-        button {
-            padding: 10px 20px;
-            margin: 0 10px;
-            font-size: 16px;
-            border: none;
-            border-radius: 5px;
-            cursor: pointer;
-            transition: background-color 0.3s;
-        }
-        #predict-btn {
-            background-color: #4CAF50;
-            color: white;
-        }
-        #clear-btn {
-            background-color: #f44336;
-            color: white;
-        }
-        button:hover {
-            opacity: 0.8;
-        }
-        .result {
-            margin: 20px 0;
-            padding: 20px;
-            border-radius: 5px;
-            background-color: #e9f7ef;
-            font-size: 18px;
-        }
-        .digit {
-            font-size: 48px;
-            font-weight: bold;
-            margin: 10px 0;
-        }
-        .confidence {
-            color: #666;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>Handwritten Digit Classifier</h1>
-        <p>Click or drag to activate cells in the 28×28 grid below, then click "Predict"</p>
-
-        <div class="drawing-container">
-            <div id="grid-container" class="grid-container"></div>
-        </div>
-
-        <div class="button-container">
-            <button id="predict-btn">Predict</button>
-            <button id="clear-btn">Clear</button>
-        </div>
-
-        <div class="result" id="result-container" style="display: none;">
-            <h2>Result:</h2>
-            <div class="digit" id="prediction">?</div>
-            <div class="confidence" id="confidence"></div>
-            <div id="status" style="font-size: 12px; color: #999;"></div>
-        </div>
-    </div>
-
-    <script>
-        // Grid dimensions
-        const GRID_SIZE = 28;
-
-        // Create the grid
-        const gridContainer = document.getElementById('grid-container');
-        const grid = [];
-
-        function createGrid() {
-            gridContainer.innerHTML = '';
-
-            // Create a 2D array to represent the grid
-            for (let i = 0; i < GRID_SIZE; i++) {
-                grid[i] = [];
-                for (let j = 0; j < GRID_SIZE; j++) {
-                    const cell = document.createElement('div');
-                    cell.className = 'grid-cell';
-                    cell.dataset.row = i;
-                    cell.dataset.col = j;
-
-                    // Add event listener for individual click
-                    cell.addEventListener('mousedown', function() {
-                        toggleCell(this);
-                    });
-
-                    // Add event listener for click and drag
-                    cell.addEventListener('mouseenter', function(e) {
-                        if (e.buttons === 1) {
-                            toggleCell(this);
-                        }
-                    });
-
-                    gridContainer.appendChild(cell);
-                    grid[i][j] = 0;  // Initialize as inactive
-                }
-            }
-
-            // Prevent default drag behavior
-            gridContainer.addEventListener('dragstart', function(e) {
-                e.preventDefault();
-            });
-        }
+    return app.send_static_file("index.html")
 
-        // Function to toggle cell state
-        function toggleCell(cell) {
-            const row = parseInt(cell.dataset.row);
-            const col = parseInt(cell.dataset.col);
 
-            if (!cell.classList.contains('active')) {
-                cell.classList.add('active');
-                grid[row][col] = 1;  // Set as active
-            }
-        }
+@app.route("/predict", methods=["POST"])
+def predict():
+    """Process the drawing data and perform digit classification.
 
-        // Touch support for mobile devices
-        gridContainer.addEventListener('touchstart', function(e) {
-            e.preventDefault();
-            const touch = e.touches[0];
-            const element = document.elementFromPoint(touch.clientX, touch.clientY);
-            if (element && element.classList.contains('grid-cell')) {
-                toggleCell(element);
-            }
-        });
-
-        gridContainer.addEventListener('touchmove', function(e) {
-            e.preventDefault();
-            const touch = e.touches[0];
-            const element = document.elementFromPoint(touch.clientX, touch.clientY);
-            if (element && element.classList.contains('grid-cell')) {
-                toggleCell(element);
-            }
-        });
-
-        // Clear grid
-        function clearGrid() {
-            const cells = document.querySelectorAll('.grid-cell');
-            cells.forEach(cell => {
-                cell.classList.remove('active');
-                const row = parseInt(cell.dataset.row);
-                const col = parseInt(cell.dataset.col);
-                grid[row][col] = 0;
-            });
-            document.getElementById('result-container').style.display = 'none';
-        }
+    This endpoint receives the grid data from the frontend as a packed
+    bitmask, classifies it (reusing cached results for drawings seen
+    before), and returns the prediction results.
+
+    Returns:
+        flask.Response: JSON response containing the prediction result,
+        confidence score, and status message, or a 400 status message for
+        malformed grid data.
+    """
+
+    # Bodies that are not valid JSON parse to None and are rejected below
+    data = request.get_json(silent=True)
+
+    # The frontend sends the binary grid packed into a base64 encoded
+    # bitmask, which also keys the prediction cache. A flat or nested list
+    # of cells under "grid" is still accepted for other clients.
+    try:
+        if not isinstance(data, dict):
+            raise TypeError("Expected a JSON object")
+        if "bits" in data:
+            grid_key = base64.b64decode(data["bits"], validate=True)
+        else:
+            grid_key = pack_grid(data["grid"])
+    except (ValueError, TypeError, OverflowError, KeyError):
+        grid_key = None
+
+    # Reject malformed grids before they reach the model or the cache
+    if grid_key is None or len(grid_key) != GRID_CELLS // 8:
+        return jsonify({"status": "Invalid grid data."}), 400
 
-        document.getElementById('clear-btn').addEventListener('click', clearGrid);
-
-        // Predict function
-        function predict() {
-            // Show loading state
-            document.getElementById('prediction').textContent = 'Processing...';
-            document.getElementById('confidence').textContent = '';
-            document.getElementById('status').textContent = '';
-            document.getElementById('result-container').style.display = 'block';
-
-            // Send to server for prediction
-            fetch('/predict', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ grid: grid })
-            })
-            .then(response => response.json())
-            .then(data => {
-                document.getElementById('prediction').textContent = data.prediction;
-                document.getElementById('confidence').textContent = `Confidence: ${data.confidence}`;
-                document.getElementById('status').textContent = data.status;
-            })
-            .catch(error => {
-                console.error('Error:', error);
-                document.getElementById('prediction').textContent = 'Error';
-                document.getElementById('confidence').textContent = 'Failed to get prediction';
-            });
+    prediction, confidence = classify(grid_key)
+
+    return jsonify(
+        {
+            "prediction": prediction,
+            "confidence": f"{confidence:.2f}%",
+            "status": "Success.",
         }
+    )
 
-        document.getElementById('predict-btn').addEventListener('click', predict);
 
-        // Initialize the grid
-        createGrid();
-    </script>
-</body>
-</html>"""
-        )
+@app.route("/templates/index.html")
+def get_template():
+    """Serve the index.html page.
 
+    This route is an alternative way to access the main page, kept at its
+    original template URL.
 
-if __name__ == "__main__":
+    Returns:
+        flask.Response: The static HTML file for the main page.
+    """
+
+    return app.send_static_file("index.html")
 
-    # Create template file
-    create_template()
+
+if __name__ == "__main__":
 
     # Run the Flask application
     app.run(debug=False)